@@ -54,10 +54,9 @@ def demonstrate_basic_usage():
     live_data = tool.monitor_live_data(5)
     
     print("\nAverage readings:")
-    for parameter, values in live_data.items():
-        if values:
-            avg = sum(values) / len(values)
-            print(f"{parameter}: {avg:.2f}")
+    for parameter, stats in live_data.items():
+        if stats["count"]:
+            print(f"{parameter}: {stats['avg']:.2f} {stats['unit']}")
     
     # Clean up
     tool.close()
@@ -7,35 +7,46 @@ Created by Khanfar Systems
 import tkinter as tk
 from tkinter import ttk
 import obd
-import threading
-import time
+import queue
+from functools import partial
 from typing import Dict, List
 import json
 from pathlib import Path
 import logging
 
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = Path("dashboard_config.json")
+
+# Upper bound on queued updates applied per refresh, keeps Tk responsive
+MAX_UPDATES_PER_DRAIN = 256
+
+def _configure_logging(log_file: str = "dashboard.log"):
+    """Setup logging configuration once for the process"""
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+
 class OBDDashboard:
     def __init__(self, root):
         """Initialize the OBD dashboard"""
         self.root = root
         self.root.title("OBD-2 Dashboard")
         self.connection = None
+        self._cmd_table = []
+        self._update_queue = queue.SimpleQueue()
+        self._drain_job = None
         self.monitoring = False
-        self.setup_logging()
         self.setup_ui()
         self.load_config()
 
-    def setup_logging(self):
-        """Setup logging configuration"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler("dashboard.log"),
-                logging.StreamHandler()
-            ]
-        )
-
     def setup_ui(self):
         """Setup the dashboard UI"""
         # Main frame
@@ -58,6 +69,7 @@ class OBDDashboard:
 
         # Initialize data labels
         self.data_labels: Dict[str, ttk.Label] = {}
+        self.data_vars: Dict[str, tk.StringVar] = {}
         self.setup_data_labels()
 
         # Control frame
@@ -96,24 +108,25 @@ class OBDDashboard:
             frame.grid(row=i//2, column=i%2, padx=5, pady=2, sticky=(tk.W, tk.E))
             
             ttk.Label(frame, text=f"{name}:").grid(row=0, column=0, sticky=tk.W)
-            value_label = ttk.Label(frame, text="--")
+            # Values change often; a bound StringVar avoids a configure() per update
+            value_var = tk.StringVar(value="--")
+            value_label = ttk.Label(frame, textvariable=value_var)
             value_label.grid(row=0, column=1, sticky=tk.E)
             
             self.data_labels[key] = value_label
+            self.data_vars[key] = value_var
 
     def load_config(self):
         """Load dashboard configuration"""
-        config_file = Path("dashboard_config.json")
-        if config_file.exists():
-            try:
-                with open(config_file, 'r') as f:
-                    self.config = json.load(f)
-            except Exception as e:
-                logging.error(f"Error loading config: {e}")
-                self.config = self.get_default_config()
-        else:
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                self.config = json.load(f)
+        except FileNotFoundError:
             self.config = self.get_default_config()
             self.save_config()
+        except Exception as e:
+            logger.error("Error loading config: %s", e)
+            self.config = self.get_default_config()
 
     def get_default_config(self) -> Dict:
         """Get default dashboard configuration"""
@@ -134,27 +147,33 @@ class OBDDashboard:
     def save_config(self):
         """Save dashboard configuration"""
         try:
-            with open("dashboard_config.json", 'w') as f:
+            with open(CONFIG_FILE, 'w') as f:
                 json.dump(self.config, f, indent=2)
         except Exception as e:
-            logging.error(f"Error saving config: {e}")
+            logger.error("Error saving config: %s", e)
 
     def connect(self):
         """Connect to OBD adapter"""
         try:
-            self.connection = obd.OBD()
+            self.connection = obd.Async(delay_cmds=self.config["update_interval"] / 1000)
             if self.connection.is_connected():
+                # Resolve configured command names once instead of per update
+                self._cmd_table = [
+                    (key, getattr(obd.commands, cmd_name))
+                    for key, cmd_name in self.config["commands"].items()
+                    if hasattr(obd.commands, cmd_name)
+                ]
                 self.conn_status.config(text="Connected")
                 self.connect_btn.config(state=tk.DISABLED)
                 self.start_btn.config(state=tk.NORMAL)
                 self.status_var.set("Connected to OBD adapter")
-                logging.info("Connected to OBD adapter")
+                logger.info("Connected to OBD adapter")
             else:
                 self.status_var.set("Connection failed")
-                logging.error("Connection failed")
+                logger.error("Connection failed")
         except Exception as e:
             self.status_var.set(f"Connection error: {str(e)}")
-            logging.error(f"Connection error: {e}")
+            logger.error("Connection error: %s", e)
 
     def start_monitoring(self):
         """Start monitoring OBD data"""
@@ -166,42 +185,75 @@ class OBDDashboard:
         self.stop_btn.config(state=tk.NORMAL)
         self.status_var.set("Monitoring started")
 
-        # Start monitoring thread
-        self.monitor_thread = threading.Thread(target=self.update_data)
-        self.monitor_thread.daemon = True
-        self.monitor_thread.start()
+        # Let the Async connection stream responses to the labels
+        self.update_data()
+        if self.monitoring:
+            self._drain_job = self.root.after(self.config["update_interval"], self._drain_queue)
 
     def stop_monitoring(self):
         """Stop monitoring OBD data"""
         self.monitoring = False
+        if self.connection:
+            self.connection.stop()
+            self.connection.unwatch_all()
+        if self._drain_job:
+            self.root.after_cancel(self._drain_job)
+            self._drain_job = None
         self.start_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         self.status_var.set("Monitoring stopped")
 
     def update_data(self):
-        """Update OBD data in the dashboard"""
-        while self.monitoring:
+        """Watch the configured commands so OBD data streams into the dashboard"""
+        try:
+            # watch() is only accepted while the Async loop is stopped
+            self.connection.stop()
+            self.connection.unwatch_all()
+            for key, cmd in self._cmd_table:
+                self.connection.watch(cmd, callback=partial(self.on_response, key))
+            self.connection.start()
+        except Exception as e:
+            logger.error("Error updating data: %s", e)
+            self.stop_monitoring()
+
+    def on_response(self, key: str, response):
+        """Queue a watched OBD response for the next dashboard refresh"""
+        value = "--" if response.is_null() else str(response.value)
+        self._update_queue.put_nowait((key, value))
+
+    def _drain_queue(self):
+        """Apply queued updates in one Tk callback on the main thread, then re-arm"""
+        # Only this method touches Tk; the Async thread just enqueues
+        latest = {}
+        for _ in range(MAX_UPDATES_PER_DRAIN):
             try:
-                for key, cmd_name in self.config["commands"].items():
-                    if hasattr(obd.commands, cmd_name):
-                        cmd = getattr(obd.commands, cmd_name)
-                        response = self.connection.query(cmd)
-                        
-                        if not response.is_null():
-                            self.root.after(0, self.update_label, key, str(response.value))
-                        else:
-                            self.root.after(0, self.update_label, key, "--")
-                
-                time.sleep(self.config["update_interval"] / 1000)
-            except Exception as e:
-                logging.error(f"Error updating data: {e}")
-                self.root.after(0, self.stop_monitoring)
+                key, value = self._update_queue.get_nowait()
+            except queue.Empty:
                 break
+            latest[key] = value
+
+        # Only the newest value per label is worth drawing
+        for key, value in latest.items():
+            self.update_label(key, value)
+
+        # The Async loop ends when the adapter drops; don't leave old values up
+        if (self.monitoring and self._cmd_table
+                and not (self.connection.running and self.connection.is_connected())):
+            logger.error("Lost connection to OBD adapter")
+            for key in self.data_vars:
+                self.update_label(key, "--")
+            self.stop_monitoring()
+            self.status_var.set("Connection lost")
+
+        if self.monitoring:
+            self._drain_job = self.root.after(self.config["update_interval"], self._drain_queue)
+        else:
+            self._drain_job = None
 
     def update_label(self, key: str, value: str):
         """Update a specific data label"""
-        if key in self.data_labels:
-            self.data_labels[key].config(text=value)
+        if key in self.data_vars:
+            self.data_vars[key].set(value)
 
     def on_closing(self):
         """Handle window closing"""
@@ -212,6 +264,7 @@ class OBDDashboard:
 
 def main():
     """Main function to run the dashboard"""
+    _configure_logging()
     root = tk.Tk()
     dashboard = OBDDashboard(root)
     root.protocol("WM_DELETE_WINDOW", dashboard.on_closing)
@@ -5,14 +5,96 @@ Created by Khanfar Systems
 """
 
 import csv
+import io
 import json
 import time
 import logging
-from datetime import datetime
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import List, Dict, Any
 import obd
+import numpy as np
+import pandas as pd
 from pathlib import Path
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional, analysis falls back to plain NumPy
+    njit = None
+    prange = range
+
+logger = logging.getLogger(__name__)
+
+# Rows parsed per block when analyzing CSV logs; bounds memory on long logs
+ANALYSIS_CHUNK_ROWS = 10000
+
+# CSV rows are buffered in memory and written out once this much text has
+# accumulated or this much time has passed, whichever comes first
+CSV_FLUSH_BYTES = 4096
+CSV_FLUSH_SECONDS = 1.0
+
+def _log_value(response: obd.OBDResponse, null=None):
+    """Value of a response as it should be logged, bare numbers for quantities"""
+    if response.is_null():
+        return null
+    value = response.value
+    # pint quantities stringify with their unit, which analysis can't parse
+    return value.magnitude if hasattr(value, 'magnitude') else str(value)
+
+def _display_value(response: obd.OBDResponse, null=None):
+    """Value of a response as readable text, unit included"""
+    return null if response.is_null() else str(response.value)
+
+def _configure_logging(log_dir: Path):
+    """Setup logging configuration once for the process"""
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_dir / "obd_logger.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+def _reduce_columns(arr: np.ndarray):
+    """Per-column (min, max, sum, count) of a 2D float array, skipping NaN"""
+    n_rows, n_cols = arr.shape
+    mins = np.full(n_cols, np.inf)
+    maxs = np.full(n_cols, -np.inf)
+    sums = np.zeros(n_cols)
+    counts = np.zeros(n_cols, dtype=np.int64)
+    for j in prange(n_cols):
+        for i in range(n_rows):
+            value = arr[i, j]
+            if value != value:  # NaN marks a missing or non-numeric sample
+                continue
+            if value < mins[j]:
+                mins[j] = value
+            if value > maxs[j]:
+                maxs[j] = value
+            sums[j] += value
+            counts[j] += 1
+    return mins, maxs, sums, counts
+
+def _reduce_columns_numpy(arr: np.ndarray):
+    """NumPy equivalent of _reduce_columns for when numba is unavailable"""
+    present = ~np.isnan(arr)
+    return (
+        np.where(present, arr, np.inf).min(axis=0, initial=np.inf),
+        np.where(present, arr, -np.inf).max(axis=0, initial=-np.inf),
+        np.where(present, arr, 0.0).sum(axis=0),
+        present.sum(axis=0)
+    )
+
+if njit is not None:
+    _reduce = njit(cache=True, parallel=True)(_reduce_columns)
+else:
+    _reduce = _reduce_columns_numpy
+
 class OBDDataLogger:
     def __init__(self, log_dir: str = "logs"):
         """Initialize the OBD data logger"""
@@ -20,28 +102,65 @@ class OBDDataLogger:
         self.log_dir.mkdir(exist_ok=True)
         self.connection = None
         self.logging = False
-        self.setup_logging()
-
-    def setup_logging(self):
-        """Setup logging configuration"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.log_dir / "obd_logger.log"),
-                logging.StreamHandler()
-            ]
-        )
-
-    def connect(self) -> bool:
-        """Establish connection with OBD adapter"""
+
+    def connect(self, interval: float = 1.0) -> bool:
+        """Establish connection with OBD adapter, polling fast enough to log every interval"""
         try:
-            self.connection = obd.OBD()
+            # Half the logging interval leaves room for the queries themselves
+            self.connection = obd.Async(delay_cmds=interval / 2)
             return self.connection.is_connected()
         except Exception as e:
-            logging.error(f"Connection failed: {e}")
+            logger.error("Connection failed: %s", e)
             return False
 
+    def _watch(self, commands: List[obd.commands]) -> deque:
+        """Stream responses for the given commands into a deque"""
+        updates = deque()
+        # watch() is only accepted while the Async loop is stopped
+        self.connection.stop()
+        self.connection.unwatch_all()
+        for cmd in commands:
+            self.connection.watch(cmd, callback=updates.append)
+        self.connection.start()
+        return updates
+
+    def _unwatch(self):
+        """Stop streaming responses from the adapter"""
+        self.connection.stop()
+        self.connection.unwatch_all()
+
+    def _timestamp(self, anchor: datetime, start_ns: int) -> str:
+        """ISO timestamp from a wall-clock anchor plus monotonic elapsed time"""
+        elapsed = timedelta(microseconds=(time.monotonic_ns() - start_ns) // 1000)
+        return (anchor + elapsed).isoformat()
+
+    def _streaming(self) -> bool:
+        """Whether the Async loop is still feeding fresh responses"""
+        return bool(self.connection and self.connection.running
+                    and self.connection.is_connected())
+
+    def _drain(self, updates: deque, latest: Dict) -> bool:
+        """Keep the most recent response per command from the stream
+
+        Once the stream has died every reading is reset to null and False
+        is returned, so old responses aren't logged as fresh ones.
+        """
+        while updates:
+            response = updates.popleft()
+            latest[response.command] = response
+        if self._streaming():
+            return True
+        for cmd in latest:
+            latest[cmd] = obd.OBDResponse()
+        return False
+
+    def _flush_buffer(self, buffer: io.StringIO, f) -> None:
+        """Move buffered log text to the file in a single write"""
+        f.write(buffer.getvalue())
+        f.flush()
+        buffer.seek(0)
+        buffer.truncate()
+
     def get_supported_commands(self) -> List[str]:
         """Get list of supported OBD commands"""
         if not self.connection:
@@ -51,94 +170,155 @@ class OBDDataLogger:
     def log_to_csv(self, commands: List[obd.commands], duration: int = 60, 
                    interval: float = 1.0) -> str:
         """Log OBD data to CSV file"""
-        if not self.connection:
-            logging.error("No connection established")
-            return ""
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_file = self.log_dir / f"obd_log_{timestamp}.csv"
-        
-        headers = ["Timestamp"] + [str(cmd) for cmd in commands]
-        
-        try:
-            with open(csv_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                
-                start_time = time.time()
-                while time.time() - start_time < duration:
-                    row = [datetime.now().isoformat()]
-                    for cmd in commands:
-                        response = self.connection.query(cmd)
-                        row.append(str(response.value) if not response.is_null() else "NULL")
-                    writer.writerow(row)
-                    time.sleep(interval)
-                    
-            logging.info(f"Data logged to {csv_file}")
-            return str(csv_file)
-        except Exception as e:
-            logging.error(f"Error logging data: {e}")
-            return ""
+        return self.log_multi(commands, duration, interval, formats=("csv",)).get("csv", "")
 
     def log_to_json(self, commands: List[obd.commands], duration: int = 60, 
                     interval: float = 1.0) -> str:
-        """Log OBD data to JSON file"""
+        """Log OBD data to JSON Lines file"""
+        return self.log_multi(commands, duration, interval, formats=("json",)).get("json", "")
+
+    def log_multi(self, commands: List[obd.commands], duration: int = 60,
+                  interval: float = 1.0, formats: tuple = ("csv", "json")) -> Dict[str, str]:
+        """Log one stream of OBD data to several file formats at once
+
+        Samples are taken once per interval and handed to one writer thread
+        per format, so file output overlaps with adapter I/O. Returns the
+        written file path per format.
+        """
         if not self.connection:
-            logging.error("No connection established")
-            return ""
+            logger.error("No connection established")
+            return {}
+
+        # Each format gets one writer, as a repeated one would reopen its file
+        formats = tuple(dict.fromkeys(formats))
+        if not formats:
+            logger.error("No log format given")
+            return {}
+
+        writers = {"csv": self._write_csv, "json": self._write_jsonl}
+        unsupported = [fmt for fmt in formats if fmt not in writers]
+        if unsupported:
+            logger.error("Unsupported log format: %s", ", ".join(unsupported))
+            return {}
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        json_file = self.log_dir / f"obd_log_{timestamp}.json"
-        
-        data = []
-        try:
-            start_time = time.time()
-            while time.time() - start_time < duration:
+        files = {
+            "csv": self.log_dir / f"obd_log_{timestamp}.csv",
+            "json": self.log_dir / f"obd_log_{timestamp}.jsonl"
+        }
+        names = [str(cmd) for cmd in commands]
+        sinks = {fmt: queue.Queue() for fmt in formats}
+
+        latest = {cmd: obd.OBDResponse() for cmd in commands}
+        sampled = False
+        with ThreadPoolExecutor(max_workers=len(formats)) as pool:
+            futures = {
+                fmt: pool.submit(writers[fmt], files[fmt], names, sinks[fmt])
+                for fmt in formats
+            }
+            try:
+                updates = self._watch(commands)
+                anchor, start_ns = datetime.now(), time.monotonic_ns()
+                streaming = True
+                next_deadline = time.monotonic()
+                end_time = next_deadline + duration
+                while time.monotonic() < end_time:
+                    next_deadline += interval
+                    time.sleep(max(0, next_deadline - time.monotonic()))
+                    if not self._drain(updates, latest) and streaming:
+                        logger.error("Lost connection to OBD adapter, logging NULL readings")
+                        streaming = False
+                    sample = (self._timestamp(anchor, start_ns), [latest[cmd] for cmd in commands])
+                    for fmt, sink in sinks.items():
+                        # A writer that already failed gets no more samples
+                        if not futures[fmt].done():
+                            sink.put(sample)
+                sampled = True
+            except Exception as e:
+                logger.error("Error logging data: %s", e)
+            finally:
+                self._unwatch()
+                for sink in sinks.values():
+                    sink.put(None)  # End of stream
+
+            results = {}
+            for fmt, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("Error logging data: %s", e)
+                    continue
+                if sampled:
+                    logger.info("Data logged to %s", files[fmt])
+                    results[fmt] = str(files[fmt])
+
+        return results
+
+    def _write_csv(self, csv_file: Path, names: List[str], samples: queue.Queue) -> None:
+        """Write queued samples to a CSV file until the end of the stream"""
+        with open(csv_file, 'w', newline='') as f:
+            buffer = io.StringIO(newline='')
+            writer = csv.writer(buffer)
+            writer.writerow(["Timestamp"] + names)
+
+            next_flush = time.monotonic() + CSV_FLUSH_SECONDS
+            try:
+                for timestamp, responses in iter(samples.get, None):
+                    row = [timestamp]
+                    row.extend([_log_value(response, "NULL") for response in responses])
+                    writer.writerow(row)
+                    if buffer.tell() >= CSV_FLUSH_BYTES or time.monotonic() >= next_flush:
+                        self._flush_buffer(buffer, f)
+                        next_flush = time.monotonic() + CSV_FLUSH_SECONDS
+            finally:
+                # Keep the rows sampled so far even if logging is interrupted
+                self._flush_buffer(buffer, f)
+
+    def _write_jsonl(self, json_file: Path, names: List[str], samples: queue.Queue) -> None:
+        """Write queued samples to a JSON Lines file until the end of the stream"""
+        # One JSON object per line, written as it is sampled
+        with open(json_file, 'w') as f:
+            for timestamp, responses in iter(samples.get, None):
                 entry = {
-                    "timestamp": datetime.now().isoformat(),
-                    "data": {}
+                    "timestamp": timestamp,
+                    "data": {name: _log_value(response) for name, response in zip(names, responses)}
                 }
-                for cmd in commands:
-                    response = self.connection.query(cmd)
-                    entry["data"][str(cmd)] = str(response.value) if not response.is_null() else None
-                data.append(entry)
-                time.sleep(interval)
-
-            with open(json_file, 'w') as f:
-                json.dump(data, f, indent=2)
-                
-            logging.info(f"Data logged to {json_file}")
-            return str(json_file)
-        except Exception as e:
-            logging.error(f"Error logging data: {e}")
-            return ""
+                f.write(json.dumps(entry, separators=(',', ':')))
+                f.write('\n')
 
     def continuous_monitor(self, commands: List[obd.commands], 
                          callback: callable = None) -> None:
         """Continuously monitor OBD data with optional callback"""
         if not self.connection:
-            logging.error("No connection established")
+            logger.error("No connection established")
             return
 
         self.logging = True
+        names = [(cmd, str(cmd)) for cmd in commands]
+        latest = {cmd: obd.OBDResponse() for cmd in commands}
         try:
+            updates = self._watch(commands)
+            streaming = True
+            next_deadline = time.monotonic()
             while self.logging:
-                data = {}
-                for cmd in commands:
-                    response = self.connection.query(cmd)
-                    data[str(cmd)] = str(response.value) if not response.is_null() else None
+                next_deadline += 0.1
+                time.sleep(max(0, next_deadline - time.monotonic()))
+                if not self._drain(updates, latest) and streaming:
+                    logger.error("Lost connection to OBD adapter")
+                    streaming = False
+                data = {name: _display_value(latest[cmd]) for cmd, name in names}
                 
                 if callback:
                     callback(data)
                 else:
                     print(data)
-                time.sleep(0.1)
         except KeyboardInterrupt:
-            logging.info("Monitoring stopped by user")
+            logger.info("Monitoring stopped by user")
         except Exception as e:
-            logging.error(f"Error in continuous monitoring: {e}")
+            logger.error("Error in continuous monitoring: %s", e)
         finally:
             self.logging = False
+            self._unwatch()
 
     def stop_monitoring(self):
         """Stop continuous monitoring"""
@@ -147,103 +327,101 @@ class OBDDataLogger:
     def analyze_log_file(self, log_file: str) -> Dict[str, Any]:
         """Analyze logged data file"""
         if not Path(log_file).exists():
-            logging.error(f"Log file not found: {log_file}")
+            logger.error("Log file not found: %s", log_file)
             return {}
 
         try:
             if log_file.endswith('.csv'):
                 return self._analyze_csv(log_file)
+            elif log_file.endswith('.jsonl'):
+                return self._analyze_jsonl(log_file)
             elif log_file.endswith('.json'):
                 return self._analyze_json(log_file)
             else:
-                logging.error("Unsupported file format")
+                logger.error("Unsupported file format")
                 return {}
         except Exception as e:
-            logging.error(f"Error analyzing log file: {e}")
+            logger.error("Error analyzing log file: %s", e)
             return {}
 
     def _analyze_csv(self, csv_file: str) -> Dict[str, Any]:
         """Analyze CSV log file"""
-        analysis = {"parameters": {}}
-        
-        with open(csv_file, 'r') as f:
-            reader = csv.DictReader(f)
-            headers = reader.fieldnames[1:]  # Skip timestamp
-            
-            for header in headers:
-                analysis["parameters"][header] = {
-                    "min": float('inf'),
-                    "max": float('-inf'),
-                    "values": []
-                }
-            
-            for row in reader:
-                for header in headers:
-                    try:
-                        value = float(row[header])
-                        analysis["parameters"][header]["values"].append(value)
-                        analysis["parameters"][header]["min"] = min(
-                            analysis["parameters"][header]["min"], value)
-                        analysis["parameters"][header]["max"] = max(
-                            analysis["parameters"][header]["max"], value)
-                    except (ValueError, TypeError):
-                        continue
-            
-            # Calculate averages
-            for param in analysis["parameters"].values():
-                if param["values"]:
-                    param["avg"] = sum(param["values"]) / len(param["values"])
-                del param["values"]  # Remove raw values to save memory
-                
-        return analysis
+        totals = {}
+        for chunk in pd.read_csv(csv_file, chunksize=ANALYSIS_CHUNK_ROWS):
+            values = chunk.iloc[:, 1:].apply(pd.to_numeric, errors='coerce')  # Skip timestamp
+            self._accumulate(totals, values)
+        return self._summarize(totals)
+
+    def _analyze_jsonl(self, jsonl_file: str) -> Dict[str, Any]:
+        """Analyze JSON Lines log file"""
+        totals = {}
+        records = []
+        with open(jsonl_file, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                records.append(json.loads(line)["data"])
+                if len(records) >= ANALYSIS_CHUNK_ROWS:
+                    self._accumulate_records(totals, records)
+                    records.clear()
+        if records:
+            self._accumulate_records(totals, records)
+        return self._summarize(totals)
 
     def _analyze_json(self, json_file: str) -> Dict[str, Any]:
-        """Analyze JSON log file"""
+        """Analyze JSON log file written as a single array"""
         with open(json_file, 'r') as f:
             data = json.load(f)
-            
+
+        totals = {}
+        self._accumulate_records(totals, [entry["data"] for entry in data])
+        return self._summarize(totals)
+
+    def _accumulate_records(self, totals: Dict[str, Dict], records: List[Dict]) -> None:
+        """Fold a block of JSON log records into running per-parameter totals"""
+        df = pd.DataFrame(records)
+        self._accumulate(totals, df.apply(pd.to_numeric, errors='coerce'))
+
+    def _accumulate(self, totals: Dict[str, Dict], values: pd.DataFrame) -> None:
+        """Fold a block of numeric samples into running per-parameter totals"""
+        mins, maxs, sums, counts = _reduce(values.to_numpy(dtype=np.float64))
+        for i, param in enumerate(values.columns):
+            total = totals.setdefault(param, {
+                "count": 0,
+                "sum": 0.0,
+                "min": float('inf'),
+                "max": float('-inf')
+            })
+            if not counts[i]:
+                continue
+            total["count"] += int(counts[i])
+            total["sum"] += float(sums[i])
+            total["min"] = min(total["min"], float(mins[i]))
+            total["max"] = max(total["max"], float(maxs[i]))
+
+    def _summarize(self, totals: Dict[str, Dict]) -> Dict[str, Any]:
+        """Turn running totals into min/max/avg per parameter"""
         analysis = {"parameters": {}}
-        
-        for entry in data:
-            for param, value in entry["data"].items():
-                if param not in analysis["parameters"]:
-                    analysis["parameters"][param] = {
-                        "min": float('inf'),
-                        "max": float('-inf'),
-                        "values": []
-                    }
-                
-                try:
-                    value = float(value) if value is not None else None
-                    if value is not None:
-                        analysis["parameters"][param]["values"].append(value)
-                        analysis["parameters"][param]["min"] = min(
-                            analysis["parameters"][param]["min"], value)
-                        analysis["parameters"][param]["max"] = max(
-                            analysis["parameters"][param]["max"], value)
-                except (ValueError, TypeError):
-                    continue
-        
-        # Calculate averages
-        for param in analysis["parameters"].values():
-            if param["values"]:
-                param["avg"] = sum(param["values"]) / len(param["values"])
-            del param["values"]  # Remove raw values to save memory
-            
+        for param, total in totals.items():
+            analysis["parameters"][param] = {"min": total["min"], "max": total["max"]}
+            # Parameters without a single numeric sample keep the empty bounds
+            if total["count"]:
+                analysis["parameters"][param]["avg"] = total["sum"] / total["count"]
         return analysis
 
     def close(self):
         """Close the OBD connection"""
         if self.connection:
             self.connection.close()
-            logging.info("OBD connection closed")
+            logger.info("OBD connection closed")
 
 def main():
     """Main function demonstrating logger usage"""
-    logger = OBDDataLogger()
+    data_logger = OBDDataLogger()
+    _configure_logging(data_logger.log_dir)
     
     print("Connecting to OBD adapter...")
-    if logger.connect():
+    if data_logger.connect(interval=0.5):
         print("Connected successfully!")
         
         # Get supported commands
@@ -256,19 +434,19 @@ def main():
         
         # Log data to CSV
         print("\nLogging data to CSV (10 seconds)...")
-        csv_file = logger.log_to_csv(commands, duration=10, interval=0.5)
+        csv_file = data_logger.log_to_csv(commands, duration=10, interval=0.5)
         
         # Analyze the log file
         if csv_file:
             print("\nAnalyzing log file...")
-            analysis = logger.analyze_log_file(csv_file)
+            analysis = data_logger.analyze_log_file(csv_file)
             print("\nAnalysis Results:")
             for param, stats in analysis["parameters"].items():
                 print(f"\n{param}:")
                 for key, value in stats.items():
                     print(f"  {key}: {value}")
         
-        logger.close()
+        data_logger.close()
     else:
         print("Failed to connect to OBD adapter!")
 
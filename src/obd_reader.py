@@ -5,27 +5,73 @@ Created by Khanfar Systems
 """
 
 import obd
+import array
+import json
 import time
+from pathlib import Path
 from typing import List, Dict, Optional
 
+# Remembers the adapter port that last connected, to skip the port scan
+PORT_CACHE_FILE = Path.home() / ".obd_cache"
+
 class OBDDiagnosticTool:
     def __init__(self):
         """Initialize the OBD connection"""
         self.connection = None
         self.supported_commands = []
 
-    def connect(self) -> bool:
-        """Establish connection with the OBD-II adapter"""
+    def connect(self, port: Optional[str] = None, baudrate: Optional[int] = None,
+                protocol: Optional[str] = None, fast: bool = True) -> bool:
+        """Establish connection with the OBD-II adapter
+
+        Any of port, baudrate and protocol that are given skip that part of
+        auto-detection. Without a port, the last port that connected is
+        tried first before scanning.
+        """
         try:
-            self.connection = obd.OBD()
+            self.connection = None
+            cached = {} if port else self._load_port_cache()
+            if cached:
+                self.connection = obd.OBD(portstr=cached.get("port"), baudrate=baudrate,
+                                          protocol=protocol or cached.get("protocol"),
+                                          fast=fast, timeout=0.1)
+                if not self.connection.is_connected():
+                    # Adapter moved or unplugged, fall back to a full scan
+                    self.connection.close()
+                    self.connection = None
+
+            if self.connection is None:
+                self.connection = obd.OBD(portstr=port, baudrate=baudrate,
+                                          protocol=protocol, fast=fast, timeout=0.1)
+
             if self.connection.is_connected():
                 self.supported_commands = self.connection.supported_commands
+                self._save_port_cache()
                 return True
             return False
         except Exception as e:
             print(f"Connection error: {e}")
             return False
 
+    def _load_port_cache(self) -> Dict[str, str]:
+        """Read the last working port and protocol, if any"""
+        try:
+            with open(PORT_CACHE_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_port_cache(self):
+        """Remember the connected port and protocol for the next run"""
+        try:
+            with open(PORT_CACHE_FILE, 'w') as f:
+                json.dump({
+                    "port": self.connection.port_name(),
+                    "protocol": self.connection.protocol_id()
+                }, f)
+        except OSError:
+            pass  # Caching is only an optimization
+
     def get_fault_codes(self) -> List[str]:
         """Read and return diagnostic trouble codes"""
         if not self.connection:
@@ -64,18 +110,17 @@ class OBDDiagnosticTool:
 
         return info
 
-    def monitor_live_data(self, duration: int = 10) -> Dict[str, List]:
-        """Monitor live data for specified duration in seconds"""
+    def monitor_live_data(self, duration: int = 10,
+                          return_samples: bool = False) -> Dict[str, Dict]:
+        """Monitor live data for specified duration in seconds
+
+        Returns running statistics per parameter (count, min, max, avg,
+        last reading and unit). With return_samples, the readings are also
+        included under "samples" as a packed array of floats.
+        """
         if not self.connection:
             return {}
 
-        data = {
-            "RPM": [],
-            "Speed": [],
-            "Throttle Position": [],
-            "Engine Load": []
-        }
-
         commands = {
             "RPM": obd.commands.RPM,
             "Speed": obd.commands.SPEED,
@@ -83,14 +128,56 @@ class OBDDiagnosticTool:
             "Engine Load": obd.commands.ENGINE_LOAD
         }
 
-        start_time = time.time()
-        while time.time() - start_time < duration:
-            for key, command in commands.items():
-                if command in self.supported_commands:
-                    response = self.connection.query(command)
-                    if not response.is_null():
-                        data[key].append(response.value)
-            time.sleep(0.5)
+        data = {}
+        for key in commands:
+            data[key] = {
+                "count": 0,
+                "sum": 0.0,
+                "min": float('inf'),
+                "max": float('-inf'),
+                "last": None,
+                "unit": ""
+            }
+            if return_samples:
+                data[key]["samples"] = array.array('d')
+
+        # Check support once rather than on every sampling pass
+        supported = tuple(
+            (command, data[key]) for key, command in commands.items()
+            if command in self.supported_commands
+        )
+
+        interval = 0.5
+        next_deadline = time.monotonic()
+        end_time = next_deadline + duration
+        while time.monotonic() < end_time:
+            for command, stats in supported:
+                response = self.connection.query(command)
+                if response.is_null():
+                    continue
+                value = response.value
+                if hasattr(value, 'magnitude'):
+                    if not stats["count"]:
+                        stats["unit"] = str(value.units)
+                    value = value.magnitude
+                value = float(value)
+                if return_samples:
+                    stats["samples"].append(value)
+                stats["count"] += 1
+                stats["sum"] += value
+                if value < stats["min"]:
+                    stats["min"] = value
+                if value > stats["max"]:
+                    stats["max"] = value
+                stats["last"] = value
+            # Sleep to the next tick so query time doesn't drift the rate
+            next_deadline += interval
+            time.sleep(max(0, next_deadline - time.monotonic()))
+
+        for stats in data.values():
+            total = stats.pop("sum")
+            if stats["count"]:
+                stats["avg"] = total / stats["count"]
 
         return data
 
@@ -125,10 +212,9 @@ def main():
         # Monitor live data
         print("\nMonitoring live data for 10 seconds...")
         live_data = tool.monitor_live_data(10)
-        for key, values in live_data.items():
-            if values:
-                avg = sum(values) / len(values)
-                print(f"Average {key}: {avg:.2f}")
+        for key, stats in live_data.items():
+            if stats["count"]:
+                print(f"Average {key}: {stats['avg']:.2f} {stats['unit']}")
         
         tool.close()
     else:
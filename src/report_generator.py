@@ -5,75 +5,294 @@ Created by Khanfar Systems
 """
 
 import obd
+import functools
+import html
 import json
 import logging
+import os
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any
-import pandas as pd
-import matplotlib.pyplot as plt
+from typing import Dict, List, Any, Optional
 from jinja2 import Template
-import webbrowser
+
+logger = logging.getLogger(__name__)
+
+# Commands read for the vehicle information section
+VEHICLE_INFO_COMMANDS = (
+    (obd.commands.VIN, "VIN"),
+    (obd.commands.ELM_VERSION, "ELM Version"),
+    (obd.commands.ELM_VOLTAGE, "Battery Voltage"),
+    (obd.commands.FUEL_TYPE, "Fuel Type"),
+    (obd.commands.DISTANCE_W_MIL, "Distance with MIL")
+)
+
+# Commands read for the sensor readings section
+SENSOR_COMMANDS = (
+    ("RPM", obd.commands.RPM),
+    ("Speed", obd.commands.SPEED),
+    ("Throttle Position", obd.commands.THROTTLE_POS),
+    ("Engine Load", obd.commands.ENGINE_LOAD),
+    ("Coolant Temp", obd.commands.COOLANT_TEMP),
+    ("Intake Temp", obd.commands.INTAKE_TEMP),
+    ("MAF", obd.commands.MAF),
+    ("O2 Voltage", obd.commands.O2_B1S1),
+    ("Fuel Level", obd.commands.FUEL_LEVEL),
+    ("Timing Advance", obd.commands.TIMING_ADVANCE)
+)
+
+# Every command the report streams while connected
+REPORT_COMMANDS = (
+    tuple(command for command, _ in VEHICLE_INFO_COMMANDS)
+    + tuple(command for _, command in SENSOR_COMMANDS)
+)
+
+# System named by the first letter of a DTC
+DTC_SYSTEMS = {
+    "P": "Powertrain",
+    "C": "Chassis",
+    "B": "Body",
+    "U": "Network"
+}
+
+# Inline SVG bar per sensor reading, GRAPH_WIDTH pixels at full scale
+GRAPH_WIDTH = 200
+GRAPH_BAR = ('<svg viewBox="0 0 {full} 30" width="{full}" height="30">'
+             '<rect y="5" width="{width:.1f}" height="20" fill="#4a90e2"/>'
+             '<text x="5" y="20" fill="#222" font-size="12">{label}</text></svg>')
+
+# Pixels per unit, so a typical full-scale reading fills the bar
+GRAPH_SCALE = {
+    "RPM": GRAPH_WIDTH / 8000,
+    "Speed": GRAPH_WIDTH / 250,
+    "Throttle Position": GRAPH_WIDTH / 100,
+    "Engine Load": GRAPH_WIDTH / 100,
+    "Coolant Temp": GRAPH_WIDTH / 130,
+    "Intake Temp": GRAPH_WIDTH / 130,
+    "MAF": GRAPH_WIDTH / 250,
+    "O2 Voltage": GRAPH_WIDTH / 1.275,
+    "Fuel Level": GRAPH_WIDTH / 100,
+    "Timing Advance": GRAPH_WIDTH / 64
+}
+
+# Longest wait for every watched command to report once before reading
+FIRST_READING_TIMEOUT = 5.0
+
+# Compiled once at import; rendering is all that happens per report
+REPORT_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <title>OBD-2 Diagnostic Report</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        .header { background-color: #f8f9fa; padding: 20px; margin-bottom: 20px; }
+        .section { margin-bottom: 30px; }
+        .data-table { width: 100%; border-collapse: collapse; }
+        .data-table td, .data-table th { 
+            border: 1px solid #ddd; 
+            padding: 8px; 
+        }
+        .data-table tr:nth-child(even) { background-color: #f2f2f2; }
+        .graph svg { display: block; }
+        .dtc-code { 
+            background-color: #fff3cd;
+            padding: 10px;
+            margin: 5px 0;
+            border-radius: 4px;
+        }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>OBD-2 Diagnostic Report</h1>
+        <p>Generated: {{ timestamp }}</p>
+    </div>
+
+    <div class="section">
+        <h2>Vehicle Information</h2>
+        <table class="data-table">
+            {% for key, value in vehicle_info.items() %}
+            <tr>
+                <td><strong>{{ key }}</strong></td>
+                <td>{{ value }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+    </div>
+
+    {% if dtc_codes %}
+    <div class="section">
+        <h2>Diagnostic Trouble Codes</h2>
+        {% for code in dtc_codes %}
+        <div class="dtc-code">
+            <strong>{{ code.code }}</strong>: {{ code.description }}
+        </div>
+        {% endfor %}
+    </div>
+    {% endif %}
+
+    <div class="section">
+        <h2>Sensor Readings</h2>
+        <table class="data-table">
+            {% for key, value in sensor_data.items() %}
+            <tr>
+                <td><strong>{{ key }}</strong></td>
+                <td>{{ value }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+    </div>
+
+    {% if graphs %}
+    <div class="section">
+        <h2>Sensor Graphs</h2>
+        <table>
+            {% for name, svg in graphs.items() %}
+            <tr>
+                <td><strong>{{ name }}</strong></td>
+                <td class="graph">{{ svg|safe }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+    </div>
+    {% endif %}
+</body>
+</html>
+""")
+
+def _configure_logging(output_dir: Path):
+    """Setup logging configuration once for the process"""
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(output_dir / "report_generator.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+def _requires_connection(default):
+    """Return default() instead of calling the method while disconnected"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.connection is None:
+                return default()
+            return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 class DiagnosticReportGenerator:
+    __slots__ = ('output_dir', 'connection', '_cache', '_watched', '_ready', '_fast_ok')
+
     def __init__(self, output_dir: str = "reports"):
         """Initialize the diagnostic report generator"""
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.connection = None
-        self.setup_logging()
-
-    def setup_logging(self):
-        """Setup logging configuration"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.output_dir / "report_generator.log"),
-                logging.StreamHandler()
-            ]
-        )
+        self._cache = {}
+        self._watched = []
+        self._ready = threading.Event()
+        self._fast_ok = None  # Whether the adapter handles fast mode, once probed
 
     def connect(self) -> bool:
         """Establish connection with OBD adapter"""
+        # A previous Async loop would keep polling the same serial port
+        self.close()
         try:
-            self.connection = obd.OBD()
-            return self.connection.is_connected()
+            self.connection = obd.Async(fast=self._fast_ok is not False, timeout=0.1)
+            if not self.connection.is_connected():
+                return False
+
+            if self._fast_ok is None:
+                self._fast_ok = self._probe_fast_mode()
+                if self._fast_ok is False:
+                    # Some adapters answer NO DATA to fast mode's response-count hint
+                    self.connection.close()
+                    self.connection = obd.Async(fast=False, timeout=0.1)
+                    if not self.connection.is_connected():
+                        return False
+
+            self._watch_all()
+            return True
         except Exception as e:
-            logging.error(f"Connection failed: {e}")
+            logger.error("Connection failed: %s", e)
             return False
 
+    def _probe_fast_mode(self) -> Optional[bool]:
+        """Check the adapter still answers a PID query in fast mode
+
+        Fast mode only appends the response-count hint once a command has
+        been answered, so RPM is queried twice and the hinted second query
+        decides. None means the probe was inconclusive.
+        """
+        if not self.connection.supports(obd.commands.RPM):
+            return None
+        # Blocking queries, the Async loop isn't running yet
+        if obd.OBD.query(self.connection, obd.commands.RPM).is_null():
+            return None
+        return not obd.OBD.query(self.connection, obd.commands.RPM).is_null()
+
+    def _watch_all(self):
+        """Stream every report command into the response cache"""
+        self._cache.clear()
+        self._ready.clear()
+        self._watched = [cmd for cmd in REPORT_COMMANDS if self.connection.supports(cmd)]
+        if not self._watched:
+            self._ready.set()
+            return
+
+        for command in self._watched:
+            self.connection.watch(command, callback=self._on_response)
+        self.connection.start()
+
+    def _on_response(self, response):
+        """Keep the latest response per command"""
+        self._cache[response.command] = response
+        if len(self._cache) >= len(self._watched):
+            self._ready.set()
+
+    def _streaming(self) -> bool:
+        """Whether the Async loop is still feeding the response cache"""
+        return bool(self.connection and self.connection.running
+                    and self.connection.is_connected())
+
+    def _wait_ready(self):
+        """Wait once for the first round of watched responses"""
+        if self._streaming() and not self._ready.wait(FIRST_READING_TIMEOUT):
+            logger.warning("Not every command answered within %ss", FIRST_READING_TIMEOUT)
+            # Serve what arrived instead of waiting again on every read
+            self._ready.set()
+
+    def _reading(self, command) -> obd.OBDResponse:
+        """Latest response for a watched command, null once the stream is dead"""
+        if not self._streaming():
+            return obd.OBDResponse()
+        return self._cache.get(command, obd.OBDResponse())
+
+    @_requires_connection(dict)
     def get_vehicle_info(self) -> Dict[str, Any]:
         """Get basic vehicle information"""
         info = {}
-        if not self.connection:
-            return info
-
-        commands = [
-            (obd.commands.VIN, "VIN"),
-            (obd.commands.ELM_VERSION, "ELM Version"),
-            (obd.commands.ELM_VOLTAGE, "Battery Voltage"),
-            (obd.commands.FUEL_TYPE, "Fuel Type"),
-            (obd.commands.DISTANCE_W_MIL, "Distance with MIL")
-        ]
-
-        for command, key in commands:
-            try:
-                response = self.connection.query(command)
-                if not response.is_null():
-                    info[key] = str(response.value)
-            except Exception as e:
-                logging.warning(f"Error getting {key}: {e}")
+        self._wait_ready()
+        for command, key in VEHICLE_INFO_COMMANDS:
+            response = self._reading(command)
+            if not response.is_null():
+                info[key] = str(response.value)
 
         return info
 
+    @_requires_connection(list)
     def get_dtc_codes(self) -> List[Dict[str, str]]:
         """Get diagnostic trouble codes"""
-        if not self.connection:
-            return []
-
         try:
-            response = self.connection.query(obd.commands.GET_DTC)
+            # DTCs aren't watched; pause streaming for a one-shot blocking
+            # query (Async.query only serves watched commands)
+            with self.connection.paused():
+                response = obd.OBD.query(self.connection, obd.commands.GET_DTC)
             if response.is_null():
                 return []
 
@@ -85,227 +304,149 @@ class DiagnosticReportGenerator:
                 })
             return codes
         except Exception as e:
-            logging.error(f"Error getting DTC codes: {e}")
+            logger.error("Error getting DTC codes: %s", e)
             return []
 
-    def get_dtc_description(self, code: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def get_dtc_description(code: str) -> str:
         """Get description for DTC code"""
         # This is a simplified version. In a real implementation,
         # you would want to use a comprehensive DTC database
-        prefix_meanings = {
-            "P": "Powertrain",
-            "C": "Chassis",
-            "B": "Body",
-            "U": "Network"
-        }
-        
-        try:
-            system = prefix_meanings.get(code[0], "Unknown")
-            return f"{system} related issue (Code: {code})"
-        except Exception:
-            return "Unknown issue"
+        system = DTC_SYSTEMS.get(code[:1], "Unknown")
+        return f"{system} related issue (Code: {code})"
 
+    @_requires_connection(dict)
     def collect_sensor_data(self) -> Dict[str, Any]:
         """Collect current sensor data"""
-        if not self.connection:
-            return {}
-
-        sensors = {
-            "RPM": obd.commands.RPM,
-            "Speed": obd.commands.SPEED,
-            "Throttle Position": obd.commands.THROTTLE_POS,
-            "Engine Load": obd.commands.ENGINE_LOAD,
-            "Coolant Temp": obd.commands.COOLANT_TEMP,
-            "Intake Temp": obd.commands.INTAKE_TEMP,
-            "MAF": obd.commands.MAF,
-            "O2 Voltage": obd.commands.O2_B1S1,
-            "Fuel Level": obd.commands.FUEL_LEVEL,
-            "Timing Advance": obd.commands.TIMING_ADVANCE
-        }
-
         data = {}
-        for name, command in sensors.items():
-            try:
-                response = self.connection.query(command)
-                if not response.is_null():
-                    data[name] = str(response.value)
-            except Exception as e:
-                logging.warning(f"Error getting {name}: {e}")
+        self._wait_ready()
+        for name, command in SENSOR_COMMANDS:
+            response = self._reading(command)
+            if not response.is_null():
+                data[name] = str(response.value)
 
         return data
 
     def generate_graphs(self, data: Dict[str, Any]) -> Dict[str, str]:
-        """Generate graphs from sensor data"""
-        graph_files = {}
-        
-        try:
-            # Convert data to pandas DataFrame
-            df = pd.DataFrame([data])
-            
-            # Generate graphs for numeric data
-            for column in df.columns:
-                try:
-                    values = pd.to_numeric(df[column])
-                    plt.figure(figsize=(8, 4))
-                    plt.bar(column, values[0])
-                    plt.title(f"{column} Reading")
-                    plt.ylabel("Value")
-                    
-                    # Save graph
-                    graph_file = self.output_dir / f"graph_{column}.png"
-                    plt.savefig(graph_file)
-                    plt.close()
-                    
-                    graph_files[column] = str(graph_file)
-                except Exception:
-                    continue
-                    
-        except Exception as e:
-            logging.error(f"Error generating graphs: {e}")
-            
-        return graph_files
-
-    def generate_html_report(self, data: Dict[str, Any]) -> str:
+        """Generate an inline SVG bar for each numeric sensor reading"""
+        graphs = {}
+        for name, raw in data.items():
+            # Keep the numeric readings, dropping units like "2500.0 revolutions_per_minute"
+            try:
+                value = float(str(raw).split()[0])
+            except (ValueError, IndexError):
+                continue
+            width = min(max(value * GRAPH_SCALE.get(name, 1), 0), GRAPH_WIDTH)
+            graphs[name] = GRAPH_BAR.format(full=GRAPH_WIDTH, width=width,
+                                            label=html.escape(str(raw)))
+        return graphs
+
+    def generate_html_report(self, data: Dict[str, Any],
+                             now: Optional[datetime] = None) -> str:
         """Generate HTML diagnostic report"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        now = now or datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
         report_file = self.output_dir / f"diagnostic_report_{timestamp}.html"
 
-        template = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>OBD-2 Diagnostic Report</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                .header { background-color: #f8f9fa; padding: 20px; margin-bottom: 20px; }
-                .section { margin-bottom: 30px; }
-                .data-table { width: 100%; border-collapse: collapse; }
-                .data-table td, .data-table th { 
-                    border: 1px solid #ddd; 
-                    padding: 8px; 
-                }
-                .data-table tr:nth-child(even) { background-color: #f2f2f2; }
-                .graph { margin: 20px 0; }
-                .dtc-code { 
-                    background-color: #fff3cd;
-                    padding: 10px;
-                    margin: 5px 0;
-                    border-radius: 4px;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>OBD-2 Diagnostic Report</h1>
-                <p>Generated: {{ timestamp }}</p>
-            </div>
-
-            <div class="section">
-                <h2>Vehicle Information</h2>
-                <table class="data-table">
-                    {% for key, value in vehicle_info.items() %}
-                    <tr>
-                        <td><strong>{{ key }}</strong></td>
-                        <td>{{ value }}</td>
-                    </tr>
-                    {% endfor %}
-                </table>
-            </div>
-
-            {% if dtc_codes %}
-            <div class="section">
-                <h2>Diagnostic Trouble Codes</h2>
-                {% for code in dtc_codes %}
-                <div class="dtc-code">
-                    <strong>{{ code.code }}</strong>: {{ code.description }}
-                </div>
-                {% endfor %}
-            </div>
-            {% endif %}
-
-            <div class="section">
-                <h2>Sensor Readings</h2>
-                <table class="data-table">
-                    {% for key, value in sensor_data.items() %}
-                    <tr>
-                        <td><strong>{{ key }}</strong></td>
-                        <td>{{ value }}</td>
-                    </tr>
-                    {% endfor %}
-                </table>
-            </div>
-
-            {% if graphs %}
-            <div class="section">
-                <h2>Sensor Graphs</h2>
-                {% for name, path in graphs.items() %}
-                <div class="graph">
-                    <h3>{{ name }}</h3>
-                    <img src="{{ path }}" alt="{{ name }} Graph">
-                </div>
-                {% endfor %}
-            </div>
-            {% endif %}
-        </body>
-        </html>
-        """
-
         try:
-            template = Template(template)
-            html_content = template.render(
-                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                vehicle_info=data.get("vehicle_info", {}),
-                dtc_codes=data.get("dtc_codes", []),
-                sensor_data=data.get("sensor_data", {}),
-                graphs=data.get("graphs", {})
-            )
+            # Write chunks as they render rather than building the whole page,
+            # into a temporary file swapped in only once it is complete
+            tmp_file = report_file.with_suffix('.html.tmp')
+            try:
+                with open(tmp_file, 'wb') as f:
+                    for chunk in REPORT_TEMPLATE.stream(
+                        timestamp=now.strftime("%Y-%m-%d %H:%M:%S"),
+                        vehicle_info=data.get("vehicle_info", {}),
+                        dtc_codes=data.get("dtc_codes", []),
+                        sensor_data=data.get("sensor_data", {}),
+                        graphs=data.get("graphs", {})
+                    ):
+                        f.write(chunk.encode('utf-8'))
+                os.replace(tmp_file, report_file)
+            finally:
+                if tmp_file.exists():
+                    tmp_file.unlink()
 
-            with open(report_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            return str(report_file)
+        except Exception as e:
+            logger.error("Error generating HTML report: %s", e)
+            return ""
 
+    def generate_json_report(self, data: Dict[str, Any],
+                             now: Optional[datetime] = None) -> str:
+        """Generate JSON report of the collected data"""
+        timestamp = (now or datetime.now()).strftime("%Y%m%d_%H%M%S")
+        report_file = self.output_dir / f"diagnostic_report_{timestamp}.json"
+
+        try:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
             return str(report_file)
         except Exception as e:
-            logging.error(f"Error generating HTML report: {e}")
+            logger.error("Error generating JSON report: %s", e)
             return ""
 
-    def generate_report(self) -> str:
-        """Generate complete diagnostic report"""
+    def collect_all(self) -> Dict[str, Any]:
+        """Collect all data that goes into a report"""
+        return {
+            "vehicle_info": self.get_vehicle_info(),
+            "dtc_codes": self.get_dtc_codes(),
+            "sensor_data": self.collect_sensor_data()
+        }
+
+    def generate_report(self, report_format: str = "html") -> str:
+        """Generate complete diagnostic report
+
+        The collected data is always written as JSON. With "html" the
+        graphs and HTML report are generated too and the HTML path is
+        returned; "json" skips them and returns the JSON path.
+        """
         if not self.connection:
-            logging.error("No connection established")
+            logger.error("No connection established")
+            return ""
+
+        if report_format not in ("html", "json"):
+            logger.error("Unsupported report format: %s", report_format)
             return ""
 
         try:
             # Collect all data
-            data = {
-                "vehicle_info": self.get_vehicle_info(),
-                "dtc_codes": self.get_dtc_codes(),
-                "sensor_data": self.collect_sensor_data()
-            }
+            data = self.collect_all()
+            # One clock reading names and stamps every file of this report
+            now = datetime.now()
 
-            # Generate graphs
-            data["graphs"] = self.generate_graphs(data["sensor_data"])
+            # Data-only report, cheap enough to always write
+            report_file = self.generate_json_report(data, now)
 
-            # Generate HTML report
-            report_file = self.generate_html_report(data)
+            if report_format == "html":
+                # Generate graphs
+                data["graphs"] = self.generate_graphs(data["sensor_data"])
+
+                # Generate HTML report
+                report_file = self.generate_html_report(data, now)
 
             if report_file:
-                logging.info(f"Report generated: {report_file}")
+                logger.info("Report generated: %s", report_file)
                 return report_file
             return ""
 
         except Exception as e:
-            logging.error(f"Error generating report: {e}")
+            logger.error("Error generating report: %s", e)
             return ""
 
     def close(self):
         """Close the OBD connection"""
         if self.connection:
             self.connection.close()
-            logging.info("OBD connection closed")
+            logger.info("OBD connection closed")
 
 def main():
     """Main function demonstrating report generation"""
+    import webbrowser
+
     generator = DiagnosticReportGenerator()
+    _configure_logging(generator.output_dir)
     
     print("Connecting to OBD adapter...")
     if generator.connect():